@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 
+import heapq
+import itertools
 import time
 from sys import intern
-from typing import Optional, NamedTuple, List, Union, Tuple, FrozenSet
+from typing import Optional, NamedTuple, List, Union, Tuple, FrozenSet, Callable, Any, Iterator, \
+    Set
 
 from pyramids import trees, tokenization
 from pyramids.categorization import Category, Property
@@ -10,7 +13,6 @@ from pyramids.category_maps import CategoryMap
 from pyramids.language import Language
 from pyramids.model import Model
 from pyramids.trees import Parse, TreeNode
-from sortedcontainers import SortedSet
 
 __author__ = 'Aaron Hosford'
 __all__ = [
@@ -27,6 +29,51 @@ ParseResult = NamedTuple('ParseResult', [('forests', List[Parse]),
                                          ('disambiguation_timed_out', bool)])
 
 
+class PrioritySet:
+    """A set of values that are popped in order of their keys, smallest first. Values with equal
+    keys are popped in the order they were added. A value that is already waiting is not added a
+    second time."""
+
+    # The parser pushes and pops every node it builds through one of these, so it's just a heap
+    # and a set behind the thinnest possible interface.
+    __slots__ = ('_key', '_heap', '_members', '_counter')
+
+    def __init__(self, key: Callable[[Any], Any]):
+        self._key = key
+        # Each entry is (key, insertion order, value). The insertion order breaks ties, so the
+        # values themselves are never compared.
+        self._heap = []  # type: List[Tuple[Any, int, Any]]
+        self._members: Set[Any] = set()
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __bool__(self) -> bool:
+        return bool(self._heap)
+
+    def __contains__(self, value: Any) -> bool:
+        return value in self._members
+
+    def __iter__(self) -> Iterator[Any]:
+        """Iterate over the waiting values in the order they would be popped."""
+        return (value for _, _, value in sorted(self._heap))
+
+    def add(self, value: Any) -> None:
+        """Add a value, unless it is already waiting."""
+        members = self._members
+        size = len(members)
+        members.add(value)
+        if len(members) != size:
+            heapq.heappush(self._heap, (self._key(value), next(self._counter), value))
+
+    def pop(self) -> Any:
+        """Remove and return the waiting value with the smallest key."""
+        value = heapq.heappop(self._heap)[2]
+        self._members.discard(value)
+        return value
+
+
 class ParserState:
     """The state of the parser as parsing proceeds."""
 
@@ -67,7 +114,7 @@ class ParserState:
         self._tokens = []
         self._token_sequence = None
         self._category_map = CategoryMap()
-        self._insertion_queue = SortedSet(key=self._insertion_key)
+        self._insertion_queue = PrioritySet(self._insertion_key)
         self._node_set_ids = set()
         self._roots = set()
 
@@ -86,7 +133,7 @@ class ParserState:
         return self._category_map
 
     @property
-    def insertion_queue(self) -> SortedSet:
+    def insertion_queue(self) -> PrioritySet:
         return self._insertion_queue
 
     @property
@@ -137,7 +184,7 @@ class ParserState:
         process it. Return a boolean indicating whether there are more
         nodes to process."""
         while self._insertion_queue and (timeout is None or time.time() < timeout):
-            node = self._insertion_queue.pop(index=0)
+            node = self._insertion_queue.pop()
             if not self._category_map.add(node):
                 # Drop it and continue on to the next one. "We've already got one!"
                 continue
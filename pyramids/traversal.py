@@ -1,14 +1,34 @@
 # -*- coding: utf-8 -*-
 
-from typing import Tuple, Dict, Set
+from functools import lru_cache
+from typing import Tuple, Dict, Set, Optional
 
 from pyramids import trees
-from pyramids.categorization import Property, Category
+from pyramids.categorization import Property, Category, LinkLabel
 from pyramids.rules import branch
 
 TraversableElement = 'Union[trees.Parse, trees.ParseTree, trees.TreeNodeInterface]'
 
 
+# The same categories turn up over and over in a parse, so the property names they refer to are
+# cached rather than decoded every time. A long-running process can see any number of distinct
+# categories, though, so the cache is bounded.
+@lru_cache(maxsize=4096)
+def _get_needed_properties(category: Category) -> Tuple[Property, ...]:
+    """Return the properties the category's needs_* and takes_* properties refer to."""
+    return tuple(Property.get(prop[6:]) for prop in category.positive_properties
+                 if prop.startswith(('needs_', 'takes_')))
+
+
+# There are only a handful of distinct link labels, so their lowercased forms are cached rather
+# than recomputed for every link. The cache is bounded all the same.
+@lru_cache(maxsize=1024)
+def _get_link_label_keys(label: LinkLabel) -> Tuple[str, Optional[str]]:
+    """Return the lowercased link label, along with its lowercased stem if it ends in _of."""
+    spelling = str(label)
+    return spelling.lower(), (spelling[:-3].lower() if spelling[-3:].lower() == '_of' else None)
+
+
 class LanguageContentHandler:
     """A content handler for natural language, in the style of the
     ContentHandler class of the xml.sax module."""
@@ -81,10 +101,8 @@ class DepthFirstTraverser:
                                  head_token_start, payload.tokens.spans[payload.token_start_index])
 
             need_sources = {}
-            for prop in payload.category.positive_properties:
-                if prop.startswith(('needs_', 'takes_')):
-                    needed = Property.get(prop[6:])
-                    need_sources[needed] = {head_token_start}
+            for needed in _get_needed_properties(payload.category):
+                need_sources[needed] = {head_token_start}
             return need_sources
 
         head_start = trees.ParseTreeUtils.get_head_token_start(element)
@@ -110,29 +128,33 @@ class DepthFirstTraverser:
             head_token_start = trees.ParseTreeUtils.get_head_token_start(component)
             nodes.append(head_token_start)
 
-            for property_name in component_need_sources:
+            for property_name, sources in component_need_sources.items():
                 # if (Property('needs_'+ property_name) not in
                 #         self.category.positive_properties and
                 #         Property('takes_'+ property_name) not in
                 #         self.category.positive_properties):
                 #     continue
-                if property_name in need_sources:
-                    need_sources[property_name] |= component_need_sources[property_name]
+                # Each component's need sources are only ever used here, so we can take ownership
+                # of the first set we see for each property and merge the rest into it in place.
+                existing = need_sources.get(property_name)
+                if existing is None:
+                    need_sources[property_name] = sources
                 else:
-                    need_sources[property_name] = component_need_sources[property_name]
+                    existing |= sources
 
             if index == payload.head_component_index:
                 head_need_sources = component_need_sources
             index += 1
 
         # Add the links as appropriate for the rule used to build this tree
+        rule = payload.rule
+        assert isinstance(rule, branch.BranchRule)
+        head_component_index = payload.head_component_index
         for index in range(len(element.components) - 1):
-            rule = payload.rule
-            assert isinstance(rule, branch.BranchRule)
             links = rule.get_link_types(element, index)
 
             # Skip the head node; there won't be any looping links.
-            if index < payload.head_component_index:
+            if index < head_component_index:
                 left_side = nodes[index]
                 right_side = head_start
             else:
@@ -140,30 +162,36 @@ class DepthFirstTraverser:
                 right_side = nodes[index + 1]
 
             for label, left, right in links:
+                lowered, of_stem = _get_link_label_keys(label)
+                # Which need sources the link attaches to doesn't depend on its direction, so we
+                # only look that up once per link.
+                in_head = lowered in head_need_sources
+                of_in_head = (not in_head and of_stem is not None and
+                              of_stem in head_need_sources)
                 if left:
-                    if str(label).lower() in head_need_sources:
+                    if in_head:
                         #     and not ((Property.get('needs_' + label.lower())
                         #               in self.category.positive_properties) or
                         #              (Property.get('takes_' + label.lower())
                         #               in self.category.positive_properties)):
-                        for node in need_sources[label.lower()]:
+                        for node in need_sources[lowered]:
                             handler.handle_link(node, left_side, label)
-                    elif label[-3:].lower() == '_of' and label[:-3].lower() in head_need_sources:
-                        for node in need_sources[label[:-3].lower()]:
+                    elif of_in_head:
+                        for node in need_sources[of_stem]:
                             handler.handle_link(left_side, node, label)
                     else:
                         handler.handle_link(right_side, left_side, label)
 
                 if right:
-                    if str(label).lower() in head_need_sources:
+                    if in_head:
                         #     and not ((Property.get('needs_' + label.lower())
                         #               in self.category.positive_properties) or
                         #              (Property.get('takes_' + label.lower())
                         #               in self.category.positive_properties)):
-                        for node in need_sources[label.lower()]:
+                        for node in need_sources[lowered]:
                             handler.handle_link(node, right_side, label)
-                    elif label[-3:].lower() == '_of' and label[:-3].lower() in head_need_sources:
-                        for node in need_sources[label[:-3].lower()]:
+                    elif of_in_head:
+                        for node in need_sources[of_stem]:
                             handler.handle_link(right_side, node, label)
                     else:
                         handler.handle_link(left_side, right_side, label)
@@ -172,11 +200,9 @@ class DepthFirstTraverser:
 
         # Figure out which nodes should get which links from outside this subtree
         parent_need_sources = {}
-        for prop in payload.category.positive_properties:
-            if prop.startswith(('needs_', 'takes_')):
-                needed = Property.get(prop[6:])
-                if needed in need_sources:
-                    parent_need_sources[needed] = need_sources[needed]
-                else:
-                    parent_need_sources[needed] = {head_start}
+        for needed in _get_needed_properties(payload.category):
+            if needed in need_sources:
+                parent_need_sources[needed] = need_sources[needed]
+            else:
+                parent_need_sources[needed] = {head_start}
         return parent_need_sources
@@ -13,14 +13,16 @@ the combinatorics inherent to the parsing process, by allowing us to treat
 a whole family of sub-trees as if they were a single entity.
 """
 
+import bisect
+import heapq
+import itertools
 import math
+import operator
 import time
-import weakref
 from abc import ABCMeta, abstractmethod
 from collections import deque
-from functools import reduce
 from typing import Sequence, Tuple, NamedTuple, Optional, Iterable, Iterator, Union, Set, \
-    FrozenSet, TypeVar, Generic
+    FrozenSet, TypeVar, Generic, List, Dict, Hashable
 
 from pyramids import categorization, tokenization
 from pyramids.categorization import Category
@@ -39,7 +41,27 @@ __all__ = [
 ]
 
 
+# Members of a node set are always TreeNodes, so we can skip the score property and read the cached
+# score directly.
+_get_node_score = operator.attrgetter('_score')
+_get_second = operator.itemgetter(1)
+_get_span = operator.attrgetter('token_start_index', 'token_end_index')
+
+# Bound at module level to save a global and attribute lookup on every node score computation.
+_log2 = math.log2
+
+
+# Most node sets only ever hold a few nodes, and for those a linear scan finds duplicates about as
+# quickly as a hash table, without the memory overhead. Node sets this size or larger switch over
+# to a set for membership tests.
+_MIN_HASHED_NODE_SET_SIZE = 8
+
+
 class PayloadInterface(metaclass=ABCMeta):
+    # Every tree node has a payload, so neither the interface nor the payload classes give their
+    # instances a __dict__.
+    __slots__ = ()
+
     rule: ParseRule
     tokens: Union[TokenSequence, Tuple[str, ...]]
     category: Category
@@ -51,6 +73,13 @@ class PayloadInterface(metaclass=ABCMeta):
         single node set."""
         raise NotImplementedError()
 
+    @property
+    def compatibility_key(self) -> Optional[Hashable]:
+        """Get a key which is equal for two payloads exactly when nodes holding them are compatible
+        to share a single node set, or None if there is no such key, in which case node sets fall
+        back on is_compatible_with()."""
+        return None
+
 
 PayloadType = TypeVar('PayloadType', bound=PayloadInterface)
 
@@ -67,14 +96,19 @@ _ParsingPayload = NamedTuple('ParsingPayload', [('tokens', TokenSequence),
 class ParsingPayload(_ParsingPayload, PayloadInterface):
     """Payload used for tree nodes at parse time."""
 
+    __slots__ = ()
+
     def is_compatible_with(self, other: 'PayloadInterface'):
         """Return whether two nodes holding this and the other payload are compatible to share a
         single node set."""
-        if not isinstance(other, ParsingPayload):
-            return False
-        return (other.token_start_index == self.token_start_index and
-                other.token_end_index == self.token_end_index and
-                other.category == self.category)
+        return (isinstance(other, ParsingPayload) and
+                other.compatibility_key == self.compatibility_key)
+
+    @property
+    def compatibility_key(self) -> Tuple[int, int, Category]:
+        """Get a key which is equal for two payloads exactly when nodes holding them are compatible
+        to share a single node set."""
+        return self.token_start_index, self.token_end_index, self.category
 
     @property
     def token_index_span(self) -> Tuple[int, int]:
@@ -92,13 +126,19 @@ _GenerationPayload = NamedTuple('GenerationPayload', [('rule', ParseRule),
 class GenerationPayload(_GenerationPayload, PayloadInterface):
     """Payload used for tree nodes at generation time."""
 
+    __slots__ = ()
+
     def is_compatible_with(self, other: PayloadInterface):
         """Return whether two nodes holding this and the other payload are compatible to share a
         single node set."""
-        if not isinstance(other, GenerationPayload):
-            return False
-        return (self.covered_graph_indices == other.covered_graph_indices and
-                self.category == other.category)
+        return (isinstance(other, GenerationPayload) and
+                other.compatibility_key == self.compatibility_key)
+
+    @property
+    def compatibility_key(self) -> Tuple[FrozenSet[int], Category]:
+        """Get a key which is equal for two payloads exactly when nodes holding them are compatible
+        to share a single node set."""
+        return self.covered_graph_indices, self.category
 
 
 class TreeUtils:
@@ -108,18 +148,67 @@ class TreeUtils:
     def restrict(node: 'TreeNodeInterface',
                  categories: Iterable[Category]) -> Iterator['TreeNodeInterface']:
         """Restrict a tree node to a particular category at parse time."""
-        payload = node.payload
-        for category in categories:
-            if payload.category in category:
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            payload = node.payload
+            for category in categories:
+                if payload.category in category:
+                    yield node
+                    break
+            else:
+                if node.components:
+                    # Reversed, so the leftmost component is popped first.
+                    stack.extend(reversed(node.components))
+
+    @staticmethod
+    def invalidate_coverage(node: 'TreeNodeInterface') -> None:
+        """Discard the cached coverage of the tree node and of every tree node containing it."""
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            # If nothing was cached here, nothing can have been cached for the ancestors either,
+            # since computing their coverage would have computed this node's.
+            if node.discard_coverage():
+                stack.extend(node.iter_parents())
+
+    @staticmethod
+    def has_ancestor(node: 'TreeNodeInterface', ancestor: 'TreeNodeInterface') -> bool:
+        """Return a boolean indicating whether the subtree rooted at the given ancestor contains
+        the given tree node."""
+        stack = [node]
+        visited = set()
+        while stack:
+            node = stack.pop()
+            if node is ancestor:
+                return True
+            if id(node) not in visited:
+                visited.add(id(node))
+                stack.extend(node.iter_parents())
+        return False
+
+    @staticmethod
+    def iter_leaves(node: 'TreeNodeInterface') -> Iterator['TreeNode']:
+        """Iterate over the leaves of the subtree rooted at the given tree node or node set from
+        left to right."""
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            # Node sets and tree nodes are the only kinds of node, so we can read their members
+            # and components directly instead of going through the public methods.
+            if isinstance(node, TreeNodeSet):
+                stack.extend(reversed(node._nodes))
+                continue
+            assert isinstance(node, TreeNode)
+            components = node._components
+            if components is None:
                 yield node
-                break
-        else:
-            if node.components:
-                for component in node.components:
-                    yield from TreeUtils.restrict(component, categories)
+            else:
+                stack.extend(reversed(components))
 
     @staticmethod
-    def update_weighted_score(node: 'TreeNodeInterface', affected_child: 'TreeNodeInterface' = None,
+    def update_weighted_score(node: 'TreeNodeInterface',
+                              affected_child: Optional['TreeNodeInterface'] = None,
                               recurse: bool = True) -> None:
         """
         Update the parse-time score of the tree node.
@@ -127,9 +216,68 @@ class TreeUtils:
         If recurse is True (default) then propagate the score upward through all trees containing
         this node.
         """
-        if node.recompute_weighted_score(affected_child) and recurse:
-            for parent in node.iter_parents():
-                TreeUtils.update_weighted_score(parent, node)
+        if not node.recompute_weighted_score(affected_child) or not recurse:
+            return
+
+        # Each parent of a node whose score changed is recomputed right away, with that node as
+        # its affected child, so, like recursing would, the propagation stops at the first node
+        # set whose score stays put, without visiting the ancestors above it. Recursing would also
+        # pass a change up from an ancestor once for every path that leads to it, though, and
+        # parse forests are full of shared sub-trees. Instead, the changed ancestors are gathered
+        # one level at a time, and one that changes more than once within a level is only passed
+        # on once, so its own parents are recomputed once for all of those changes. Nodes are
+        # tracked by id to avoid calling their Python-level __hash__.
+        changed = [node]  # type: List[TreeNodeInterface]
+        while changed:
+            children = changed
+            changed = []
+            seen = set()  # type: Set[int]
+            for child in children:
+                for parent in child.iter_parents():
+                    if parent.recompute_weighted_score(child):
+                        parent_id = id(parent)
+                        if parent_id not in seen:
+                            seen.add(parent_id)
+                            changed.append(parent)
+
+    @staticmethod
+    def update_weighted_scores_above(leaves: Iterable['TreeNodeInterface']) -> None:
+        """Recompute the parse-time scores of the given leaves and of every node above them, after
+        their rules' scores have been adjusted."""
+        # Every node above the adjusted leaves has to be rescored, and each one only after all of
+        # its affected children have been, so we first count how many affected children each of
+        # them has, and then rescore them in topological order, each exactly once. Nodes are
+        # tracked by id to avoid calling their Python-level __hash__.
+        unique_leaves = []  # type: List[TreeNodeInterface]
+        pending = {}  # type: Dict[int, int]
+        for leaf in leaves:
+            if id(leaf) not in pending:
+                pending[id(leaf)] = 0
+                unique_leaves.append(leaf)
+        stack = list(unique_leaves)
+        while stack:
+            item = stack.pop()
+            for parent in item.iter_parents():
+                parent_id = id(parent)
+                if parent_id in pending:
+                    pending[parent_id] += 1
+                else:
+                    pending[parent_id] = 1
+                    stack.append(parent)
+
+        # Hoisted out of the loop, which visits every node above the leaves.
+        update_weighted_score = TreeUtils.update_weighted_score
+        queue = deque(unique_leaves)
+        pop = queue.popleft
+        push = queue.append
+        while queue:
+            item = pop()
+            update_weighted_score(item, recurse=False)
+            for parent in item.iter_parents():
+                parent_id = id(parent)
+                pending[parent_id] -= 1
+                if not pending[parent_id]:
+                    push(parent)
 
     @staticmethod
     def adjust_score(node: 'TreeNodeInterface', target: float) -> None:
@@ -182,39 +330,51 @@ class ParseTreeUtils:
     @staticmethod
     def get_head_token_start(node: 'TreeNodeInterface[ParsingPayload]') -> int:
         """Return the starting index of the head token of the phrase for this tree node."""
-        payload = node.payload
-        if node.is_leaf():
-            return payload.token_start_index
-        return ParseTreeUtils.get_head_token_start(
-            node.components[payload.head_component_index].best_node
-        )
+        while not node.is_leaf():
+            node = node.components[node.payload.head_component_index].best_node
+        return node.payload.token_start_index
 
     @staticmethod
     def to_str(node: 'TreeNodeInterface[ParsingPayload]', simplify: bool = False) -> str:
         """Generate a string representation of a parse-time tree node."""
-        payload = node.payload
-        result = payload.category.to_str(simplify) + ':'
-        if node.is_leaf():
-            covered_tokens = ' '.join(
-                payload.tokens[payload.token_start_index:payload.token_end_index]
-            )
-            result += ' ' + repr(covered_tokens) + ' ' + repr(payload.token_index_span)
-            if not simplify:
-                result += ' [' + str(payload.rule) + ']'
-        elif len(node.components) == 1 and simplify:
-            result += ' ' + ParseTreeUtils.to_str(node.components[0], simplify)
-        else:
-            if not simplify:
-                result += ' [' + str(payload.rule) + ']'
-            for component in node.components:
-                result += '\n    ' + ParseTreeUtils.to_str(component, simplify).replace('\n',
-                                                                                        '\n    ')
-        return result
+        pieces = []
+        # The stack holds string fragments, which are emitted as is, and (node, indent) pairs,
+        # which are expanded into more fragments.
+        stack = [(node, '')]  # type: List[Union[str, Tuple[TreeNodeInterface, str]]]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                pieces.append(item)
+                continue
+            node, indent = item
+            payload = node.payload
+            pieces.append(payload.category.to_str(simplify) + ':')
+            if node.is_leaf():
+                covered_tokens = ' '.join(
+                    payload.tokens[payload.token_start_index:payload.token_end_index]
+                )
+                pieces.append(' ' + repr(covered_tokens) + ' ' + repr(payload.token_index_span))
+                if not simplify:
+                    pieces.append(' [' + str(payload.rule) + ']')
+            elif len(node.components) == 1 and simplify:
+                pieces.append(' ')
+                stack.append((node.components[0], indent))
+            else:
+                if not simplify:
+                    pieces.append(' [' + str(payload.rule) + ']')
+                child_indent = indent + '    '
+                # Reversed, so the leftmost component is popped first.
+                for component in reversed(node.components):
+                    stack.append((component, child_indent))
+                    stack.append('\n' + child_indent)
+        return ''.join(pieces)
 
 
 class TreeNodeInterface(Generic[PayloadType], metaclass=ABCMeta):
     """Abstract interface for various types of interoperable tree nodes."""
 
+    __slots__ = ()
+
     @property
     @abstractmethod
     def payload(self) -> PayloadType:
@@ -234,6 +394,12 @@ class TreeNodeInterface(Generic[PayloadType], metaclass=ABCMeta):
         node."""
         raise NotImplementedError()
 
+    @abstractmethod
+    def discard_coverage(self) -> bool:
+        """Discard the coverage cached for this node, without touching its ancestors. Return a
+        boolean indicating whether there was anything cached."""
+        raise NotImplementedError()
+
     @abstractmethod
     def iter_parents(self) -> Iterator['TreeNodeInterface[PayloadType]']:
         """Iterate over the parents of this node."""
@@ -251,7 +417,7 @@ class TreeNodeInterface(Generic[PayloadType], metaclass=ABCMeta):
 
     @abstractmethod
     def add_parent(self, parent: 'TreeNodeInterface[PayloadType]') -> None:
-        """Add a weak reference to a parent of this node."""
+        """Record a parent of this node."""
         raise NotImplementedError()
 
     @abstractmethod
@@ -267,12 +433,12 @@ class TreeNodeInterface(Generic[PayloadType], metaclass=ABCMeta):
 
     @property
     @abstractmethod
-    def raw_score(self) -> Tuple[int, float, float]:
+    def raw_score(self) -> Tuple[float, float, float]:
         raise NotImplementedError()
 
     @abstractmethod
-    def recompute_weighted_score(self,
-                                 affected_child: 'TreeNodeInterface[PayloadType]' = None) -> bool:
+    def recompute_weighted_score(
+            self, affected_child: Optional['TreeNodeInterface[PayloadType]'] = None) -> bool:
         """Recompute the score of the tree node."""
         raise NotImplementedError()
 
@@ -280,20 +446,26 @@ class TreeNodeInterface(Generic[PayloadType], metaclass=ABCMeta):
 class TreeNode(TreeNodeInterface[PayloadType]):
     """Represents a branch or leaf node in a parse tree during parsing."""
 
+    # Parsing creates enormous numbers of these, so we avoid giving each one a __dict__.
+    __slots__ = ('_payload', '_components', '_hash', '_parents', '_coverage', '_score',
+                 '_raw_score')
+
     def __init__(self, payload: PayloadInterface,
                  components: Optional[Tuple[TreeNodeInterface[PayloadType], ...]]):
         self._payload = payload
         self._components = components
-        self._hash = (hash(self._payload) * 5) ^ (hash(self._components) * 2)
-        self._parents = None
+        self._hash = hash((payload, components))
+        # A tree node almost always belongs to exactly one node set, so a lone parent is stored
+        # directly, and a list is only allocated once a second parent turns up.
+        self._parents: Union[None, TreeNodeInterface[PayloadType],
+                             List[TreeNodeInterface[PayloadType]]] = None
+        self._coverage = None  # type: Optional[int]
         self._score = None  # type: Optional[Tuple[float, float]]
-        self._raw_score = None  # type: Optional[Tuple[int, float, float]]
+        self._raw_score = None  # type: Optional[Tuple[float, float, float]]
 
-        if components:
-            # This has to happen after the hash is determined, since the node will be added to the
-            # components' parent sets.
-            for component in components:
-                component.add_parent(self)
+        # The node is only recorded as a parent of its components once it is accepted into a node
+        # set. Parsing throws away plenty of duplicate nodes, which would otherwise linger on as
+        # parents of their components.
 
     def __hash__(self) -> int:
         return self._hash
@@ -301,8 +473,11 @@ class TreeNode(TreeNodeInterface[PayloadType]):
     def __eq__(self, other: 'TreeNode') -> bool:
         if not isinstance(other, TreeNode):
             return NotImplemented
-        return self is other or (self._hash == other._hash and self._payload == other._payload and
-                                 self._components == other._components)
+        # Node sets compare by identity, so the components are cheaper to compare than the payload,
+        # which may have to call the rule's __eq__.
+        return self is other or (self._hash == other._hash and
+                                 self._components == other._components and
+                                 self._payload == other._payload)
 
     def __ne__(self, other: 'TreeNode') -> bool:
         if not isinstance(other, TreeNode):
@@ -327,7 +502,19 @@ class TreeNode(TreeNodeInterface[PayloadType]):
     def coverage(self) -> int:
         """Compute the number of unique combinatoric variations of the subtree rooted at this
         node."""
-        return 1 if self.is_leaf() else reduce(lambda a, b: a * b.coverage, self.components, 1)
+        if self._coverage is None:
+            components = self._components
+            self._coverage = (1 if components is None
+                              else math.prod(component.coverage for component in components))
+        return self._coverage
+
+    def discard_coverage(self) -> bool:
+        """Discard the coverage cached for this node, without touching its ancestors. Return a
+        boolean indicating whether there was anything cached."""
+        if self._coverage is None:
+            return False
+        self._coverage = None
+        return True
 
     @property
     def score(self) -> Tuple[float, float]:
@@ -335,14 +522,18 @@ class TreeNode(TreeNodeInterface[PayloadType]):
         return self._score
 
     @property
-    def raw_score(self) -> Tuple[int, float, float]:
+    def raw_score(self) -> Tuple[float, float, float]:
         assert self._raw_score is not None
         return self._raw_score
 
-    def iter_parents(self) -> Iterator['TreeNode[PayloadType]']:
+    def iter_parents(self) -> Iterator[TreeNodeInterface[PayloadType]]:
         """Iterate over the parents of this node."""
-        if self._parents:
-            yield from self._parents
+        parents = self._parents
+        if parents is None:
+            return iter(())
+        if isinstance(parents, list):
+            return iter(parents)
+        return iter((parents,))
 
     def is_leaf(self) -> bool:
         """Return a boolean indicating whether this node is a leaf."""
@@ -350,31 +541,26 @@ class TreeNode(TreeNodeInterface[PayloadType]):
 
     def iter_leaves(self) -> Iterator[TreeNodeInterface[PayloadType]]:
         """Iterate over the leaves of the subtree rooted at this node from left to right."""
-        if self.is_leaf():
-            yield self
-        else:
-            for component in self.components:
-                yield from component.iter_leaves()
+        return TreeUtils.iter_leaves(self)
 
     def add_parent(self, parent: TreeNodeInterface[PayloadType]) -> None:
-        """Add a weak reference to a parent of this node."""
+        """Record a parent of this node."""
         assert not parent.has_ancestor(self)
-        if self._parents is None:
-            self._parents = weakref.WeakSet({parent})
+        parents = self._parents
+        if parents is None:
+            self._parents = parent
+        elif isinstance(parents, list):
+            parents.append(parent)
         else:
-            self._parents.add(parent)
+            self._parents = [parents, parent]
 
     def has_ancestor(self, ancestor: TreeNodeInterface[PayloadType]) -> bool:
         """Return a boolean indicating whether the subtree rooted at the given ancestor contains
         this node."""
-        if ancestor is self:
-            return True
-        if not self._parents:
-            return False
-        return any(parent.has_ancestor(ancestor) for parent in self._parents)
+        return TreeUtils.has_ancestor(self, ancestor)
 
-    def recompute_weighted_score(self,
-                                 affected_child: TreeNodeInterface[PayloadType] = None) -> bool:
+    def recompute_weighted_score(
+            self, affected_child: Optional[TreeNodeInterface[PayloadType]] = None) -> bool:
         """
         Update the parse-time score of the tree node.
 
@@ -382,25 +568,29 @@ class TreeNode(TreeNodeInterface[PayloadType]):
         this node.
         """
         # TODO: Take advantage of the affected_child argument.
-        total_weighted_score, total_weight = self.payload.rule.calculate_weighted_score(self)
-        if self.is_leaf():
-            depth = 1.0
-        else:
-            depth = total_weight
-            for component in self.components:
-                raw_score = component.raw_score
-                assert raw_score is not None
-                component_depth, weighted_score, weight = raw_score
+        total_weighted_score, total_weight = self._payload.rule.calculate_weighted_score(self)
+        components = self._components
+        if components is None:
+            # A leaf always has a depth of 1, and log2(1 + 1) is exactly 1, so there's no need to
+            # compute the depth penalty.
+            self._raw_score = (1.0, total_weighted_score, total_weight)
+            self._score = (float(total_weighted_score), total_weight)
+            return True
 
-                # It's already weighted, so don't multiply it
-                total_weighted_score += weighted_score
+        depth = total_weight
+        for component in components:
+            # The raw_score property asserts that the score has been computed.
+            component_depth, weighted_score, weight = component.raw_score
 
-                total_weight += weight
-                depth += component_depth * weight
-            depth /= total_weight
+            # It's already weighted, so don't multiply it
+            total_weighted_score += weighted_score
+
+            total_weight += weight
+            depth += component_depth * weight
+        depth /= total_weight
 
         self._raw_score = (depth, total_weighted_score, total_weight)
-        self._score = (total_weighted_score / math.log(1 + depth, 2), total_weight)
+        self._score = (total_weighted_score / _log2(1 + depth), total_weight)
 
         return True
 
@@ -417,18 +607,33 @@ class TreeNode(TreeNodeInterface[PayloadType]):
 class BuildTreeNode:
     """Represents a branch or leaf node in a parse tree during reconstruction."""
 
+    __slots__ = ('_rule', '_category', '_head_node', '_components', '_nodes', '_node_coverage',
+                 '_tokens', '_hash')
+
     def __init__(self, rule: ParseRule, category: Category, head_spelling: str, head_index: int,
                  components: Iterable['BuildTreeNode'] = None):
         self._rule = rule
         self._category = category
         self._head_node = (head_spelling, head_index)
         self._components = None if components is None else tuple(components)
-        self._nodes = ((self._head_node,)
-                       if components is None
-                       else sum((component.nodes for component in components), ()))
-        self._node_coverage = frozenset(index for spelling, index in self._nodes)
-        self._tokens = tuple(spelling for spelling, index in self._nodes)
-        self._hash = None
+        if self._components is None:
+            self._nodes = (self._head_node,)  # type: Tuple[Tuple[str, int], ...]
+        else:
+            self._nodes = tuple(itertools.chain.from_iterable(component._nodes
+                                                              for component in self._components))
+        if self._nodes:
+            spellings, indices = zip(*self._nodes)
+        else:
+            # A node built from an empty sequence of components has no tokens, and there is
+            # nothing to transpose.
+            spellings = indices = ()
+        self._node_coverage = frozenset(indices)  # type: FrozenSet[int]
+        self._tokens = spellings  # type: Tuple[str, ...]
+        # The components have already computed their own hashes, so we use those instead of
+        # hashing the components all over again.
+        self._hash = hash((rule, category, self._head_node,  # type: int
+                           None if self._components is None
+                           else tuple(component._hash for component in self._components)))
 
     def __repr__(self) -> str:
         if self.is_leaf():
@@ -443,22 +648,23 @@ class BuildTreeNode:
         return self.to_str()
 
     def __hash__(self) -> int:
-        if self._hash is None:
-            self._hash = (hash(self._rule) ^ hash(self._category) ^ hash(self._head_node) ^
-                          hash(self._components))
         return self._hash
 
     def __eq__(self, other: 'BuildTreeNode') -> bool:
         if not isinstance(other, BuildTreeNode):
             return NotImplemented
-        return (self._rule == other._rule and self._category == other._category and
-                self._head_node == other._head_node and self._components == other._components)
+        # The cheapest comparisons go first. Rules compare in Python, so we only call their __eq__
+        # when they aren't the very same rule.
+        return self is other or (self._hash == other._hash and
+                                 self._head_node == other._head_node and
+                                 self._category == other._category and
+                                 self._components == other._components and
+                                 (self._rule is other._rule or self._rule == other._rule))
 
     def __ne__(self, other: 'BuildTreeNode') -> bool:
         if not isinstance(other, BuildTreeNode):
             return NotImplemented
-        return (self._rule != other._rule or self._category != other._category or
-                self._head_node != other._head_node or self._components != other._components)
+        return not self == other
 
     @property
     def rule(self) -> ParseRule:
@@ -496,33 +702,53 @@ class BuildTreeNode:
         return self._components is None
 
     def to_str(self, simplify: bool = False) -> str:
-        result = self.category.to_str(simplify) + ':'
-        if self.is_leaf():
-            covered_tokens = ' '.join(self.tokens)
-            result += ' ' + repr(covered_tokens)
+        pieces = []  # type: List[str]
+        self._to_str(pieces, '', simplify)
+        return ''.join(pieces)
+
+    def _to_str(self, pieces: List[str], indent: str, simplify: bool) -> None:
+        # Each subtree appends its fragments to the same list, already indented, instead of
+        # building its own string for its parent to copy and re-indent.
+        pieces.append(self._category.to_str(simplify) + ':')
+        components = self._components
+        if components is None:
+            covered_tokens = ' '.join(self._tokens)
+            pieces.append(' ' + repr(covered_tokens))
             if not simplify:
-                result += ' [' + str(self.rule) + ']'
-        elif len(self.components) == 1 and simplify:
-            result += ' ' + self.components[0].to_str(simplify)
+                pieces.append(' [' + str(self._rule) + ']')
+        elif len(components) == 1 and simplify:
+            pieces.append(' ')
+            components[0]._to_str(pieces, indent, simplify)
         else:
             if not simplify:
-                result += ' [' + str(self.rule) + ']'
-            for component in self.components:
-                result += '\n    ' + component.to_str(simplify).replace('\n', '\n    ')
-        return result
+                pieces.append(' [' + str(self._rule) + ']')
+            child_indent = indent + '    '
+            for component in components:
+                pieces.append('\n' + child_indent)
+                component._to_str(pieces, child_indent, simplify)
 
 
 class TreeNodeSet(TreeNodeInterface[PayloadType]):
     """A set of tree nodes that cover the same phrase with the same category."""
 
+    __slots__ = ('_nodes', '_node_set', '_parents', '_coverage', '_best_node', '_best_score',
+                 '_compatibility_key')
+
     def __init__(self, nodes: Union[TreeNodeInterface[PayloadType],
                                     Iterable[TreeNodeInterface[PayloadType]]]):
-        self._nodes = set()  # type: Set[TreeNodeInterface[PayloadType]]
-        self._parents = weakref.WeakSet()
+        # The members, in the order they were added, and once there are enough of them, a set of
+        # the same members for fast membership tests.
+        self._nodes = []  # type: List[TreeNodeInterface[PayloadType]]
+        self._node_set = None  # type: Optional[Set[TreeNodeInterface[PayloadType]]]
+        self._parents = []  # type: List[TreeNodeInterface[PayloadType]]
+        self._coverage = None  # type: Optional[int]
+        # The score the best node had when it was last chosen, or None if it has to be found again.
+        self._best_score = None  # type: Optional[Tuple[float, float]]
 
         if isinstance(nodes, TreeNodeInterface):
             first_node = nodes
             self._best_node = first_node
+            self._compatibility_key = first_node.payload.compatibility_key
             self.add(first_node)
         else:
             node_iterator = iter(nodes)
@@ -530,7 +756,8 @@ class TreeNodeSet(TreeNodeInterface[PayloadType]):
                 first_node = next(node_iterator)
             except StopIteration:
                 raise ValueError("ParseTreeNodeSet must contain at least one node.")
-            self._best_node = first_node  # type: TreeNodeInterface
+            self._best_node = first_node
+            self._compatibility_key = first_node.payload.compatibility_key
 
             self.add(first_node)
             for node in node_iterator:
@@ -546,7 +773,9 @@ class TreeNodeSet(TreeNodeInterface[PayloadType]):
         return len(self._nodes)
 
     def __contains__(self, node: 'TreeNodeInterface[PayloadType]') -> bool:
-        return node in self._nodes
+        if self._node_set is None:
+            return node in self._nodes
+        return node in self._node_set
 
     @property
     def best_node(self) -> TreeNodeInterface[PayloadType]:
@@ -556,8 +785,9 @@ class TreeNodeSet(TreeNodeInterface[PayloadType]):
     @best_node.setter
     def best_node(self, node: TreeNodeInterface[PayloadType]) -> None:
         """Get the node in this node set with the highest score."""
-        assert node in self._nodes
+        assert node in self
         self._best_node = node
+        self._best_score = None
 
     @property
     def payload(self) -> PayloadType:
@@ -568,7 +798,17 @@ class TreeNodeSet(TreeNodeInterface[PayloadType]):
     def coverage(self) -> int:
         """Compute the number of unique combinatoric variations of the subtree rooted at this node
         set."""
-        return sum(node.coverage for node in self._nodes)
+        if self._coverage is None:
+            self._coverage = sum(node.coverage for node in self._nodes)
+        return self._coverage
+
+    def discard_coverage(self) -> bool:
+        """Discard the coverage cached for this node set, without touching its ancestors. Return
+        a boolean indicating whether there was anything cached."""
+        if self._coverage is None:
+            return False
+        self._coverage = None
+        return True
 
     @property
     def components(self) -> Tuple[TreeNodeInterface[PayloadType], ...]:
@@ -580,11 +820,11 @@ class TreeNodeSet(TreeNodeInterface[PayloadType]):
         return self._best_node.score
 
     @property
-    def raw_score(self) -> Tuple[int, float, float]:
+    def raw_score(self) -> Tuple[float, float, float]:
         return self._best_node.raw_score
 
-    def recompute_weighted_score(self,
-                                 affected_child: 'TreeNodeInterface[PayloadType]' = None) -> bool:
+    def recompute_weighted_score(
+            self, affected_child: Optional['TreeNodeInterface[PayloadType]'] = None) -> bool:
         """
         Update the parse-time score of the tree node set.
 
@@ -594,13 +834,26 @@ class TreeNodeSet(TreeNodeInterface[PayloadType]):
         If recurse is True (default) then propagate the score upward through all trees containing
         this node set.
         """
-        if affected_child is None or affected_child is self._best_node:
-            self._best_node = max(self._nodes, key=lambda n: n.score)
-            return True
-        elif self._best_node.score < affected_child.score:
-            self._best_node = affected_child
-            return True
-        return False
+        best_node = self._best_node
+        if affected_child is not None:
+            affected_score = _get_node_score(affected_child)
+            if affected_child is best_node:
+                # If the best node's score went up (or stayed put), it's still the best, so we
+                # only need to search the members again when it went down.
+                best_score = self._best_score
+                if best_score is not None and not affected_score < best_score:
+                    self._best_score = affected_score
+                    return True
+            elif _get_node_score(best_node) < affected_score:
+                self._best_node = affected_child
+                self._best_score = affected_score
+                return True
+            else:
+                return False
+        best_node = max(self._nodes, key=_get_node_score)
+        self._best_node = best_node
+        self._best_score = _get_node_score(best_node)
+        return True
 
     def is_leaf(self) -> bool:
         """Return a boolean indicating whether this node is a leaf."""
@@ -612,8 +865,7 @@ class TreeNodeSet(TreeNodeInterface[PayloadType]):
 
     def iter_parents(self) -> Iterator[TreeNodeInterface[PayloadType]]:
         """Iterate over the parents of this node set."""
-        if self._parents:
-            yield from self._parents
+        return iter(self._parents)
 
     def add(self, node: TreeNodeInterface[PayloadType]) -> None:
         """Add a new node to this node set."""
@@ -621,40 +873,77 @@ class TreeNodeSet(TreeNodeInterface[PayloadType]):
             for member in node:
                 self.add(member)
         else:
-            if (self._best_node is not None and
-                    not self._best_node.payload.is_compatible_with(node.payload)):
+            # Compatibility is the same for every member, so we compare against the key of the
+            # first member instead of calling is_compatible_with() on the best node's payload,
+            # unless the payloads don't provide a key.
+            compatibility_key = self._compatibility_key
+            if compatibility_key is None:
+                if not self._best_node.payload.is_compatible_with(node.payload):
+                    raise ValueError("Node is not compatible.")
+            elif node.payload.compatibility_key != compatibility_key:
                 raise ValueError("Node is not compatible.")
-            self._nodes.add(node)
+            node_set = self._node_set
+            if node_set is None:
+                if node in self._nodes:
+                    return
+                self._nodes.append(node)
+                if len(self._nodes) >= _MIN_HASHED_NODE_SET_SIZE:
+                    self._node_set = set(self._nodes)
+            else:
+                # Checking the size lets us detect duplicates with a single hash table probe.
+                size = len(node_set)
+                node_set.add(node)
+                if len(node_set) == size:
+                    return
+                self._nodes.append(node)
+            # Only now that the node has been accepted is it linked into the graph, both as a
+            # member of this set and as a parent of its components.
             node.add_parent(self)
+            components = node.components
+            if components:
+                for component in components:
+                    component.add_parent(node)
+                # Until now, score changes in the components weren't passed on to the node, so
+                # the score it was built with may be stale.
+                node.recompute_weighted_score()
+            # Coverage is cached, so anything that counted this set's variations is now stale.
+            TreeUtils.invalidate_coverage(self)
             if self._best_node is None:
                 self._best_node = node
 
     def iter_leaves(self) -> Iterator[TreeNode[PayloadType]]:
         """Iterate over the leaves of the subtree rooted at this node from left to right."""
-        for node in self._nodes:
-            yield from node.iter_leaves()
+        return TreeUtils.iter_leaves(self)
 
     def add_parent(self, parent: TreeNode[PayloadType]) -> None:
-        """Add a weak reference to a parent of this node."""
+        """Record a parent of this node."""
         assert not parent.has_ancestor(self)
-        self._parents.add(parent)
+        self._parents.append(parent)
 
     def has_ancestor(self, ancestor: TreeNodeInterface[PayloadType]) -> bool:
         """Return a boolean indicating whether the subtree rooted at the given ancestor contains
         this node."""
-        if ancestor is self:
-            return True
-        if not self._parents:
-            return False
-        return any(parent.has_ancestor(ancestor) for parent in self._parents)
+        return TreeUtils.has_ancestor(self, ancestor)
 
 
 class ParseTree:
     """Represents a complete parse tree."""
 
+    # The category and token span are plain attributes, rather than properties, because they are
+    # read constantly during disambiguation.
+    __slots__ = ('_tokens', '_root', '_hash', 'category', 'token_start_index', 'token_end_index')
+
     def __init__(self, tokens: tokenization.TokenSequence, root: TreeNodeSet[ParsingPayload]):
         self._tokens = tokens
         self._root = root
+        self._hash = hash((tokens, root))
+
+        # Every node in the root node set has the same category and span, so these can't change
+        # even when the best node does.
+        payload = root.payload
+        self.category = payload.category  # type: Category
+        self.token_start_index = payload.token_start_index  # type: int
+        self.token_end_index = payload.token_end_index  # type: int
 
     def __repr__(self) -> str:
         return type(self).__name__ + "(" + repr(self._tokens) + ", " + repr(self._root) + ")"
@@ -663,12 +952,13 @@ class ParseTree:
         return self.to_str()
 
     def __hash__(self) -> int:
-        return hash(self._tokens) ^ hash(self._root)
+        return self._hash
 
     def __eq__(self, other: 'ParseTree') -> bool:
         if not isinstance(other, ParseTree):
             return NotImplemented
-        return self is other or (self._tokens == other._tokens and self._root == other._root)
+        return self is other or (self._hash == other._hash and self._tokens == other._tokens and
+                                 self._root == other._root)
 
     def __ne__(self, other: 'ParseTree') -> bool:
         if not isinstance(other, ParseTree):
@@ -683,18 +973,6 @@ class ParseTree:
     def root(self) -> TreeNodeSet:
         return self._root
 
-    @property
-    def category(self) -> Category:
-        return self._root.best_node.payload.category
-
-    @property
-    def token_start_index(self) -> int:
-        return self._root.best_node.payload.token_start_index
-
-    @property
-    def token_end_index(self) -> int:
-        return self._root.best_node.payload.token_end_index
-
     @property
     def coverage(self) -> int:
         return self._root.coverage
@@ -718,16 +996,7 @@ class ParseTree:
 
     def adjust_score(self, target: float) -> None:
         TreeUtils.adjust_score(self.root, target)
-
-        queue = deque(self.root.iter_leaves())
-        visited = set()
-        while queue:
-            item = queue.popleft()
-            if item in visited:
-                continue
-            TreeUtils.update_weighted_score(item, recurse=False)
-            visited.add(item)
-            queue.extend(item.iter_parents())
+        TreeUtils.update_weighted_scores_above(self.root.iter_leaves())
 
 
 class Parse:
@@ -739,11 +1008,25 @@ class Parse:
     collection of ParseTrees which apply to the input after parsing is
     complete."""
 
+    __slots__ = ('_tokens', '_token_count', '_parse_trees', '_hash', '_score', '_rank',
+                 '_ambiguous', '_trees_by_span', '_trees_by_start', '_reachable', '_gaps',
+                 '_gap_size', '_max_tree_width')
+
     def __init__(self, tokens, parse_trees: Iterable[ParseTree]):
         self._tokens = tokens
+        # The token sequence's __len__ is implemented in Python, so we only call it the once.
+        self._token_count = len(tokens)  # type: int
         self._parse_trees = frozenset(parse_trees)
         self._hash = None
         self._score = None
+        self._rank = None
+        self._ambiguous = None
+        self._trees_by_span = None  # type: Optional[Tuple[ParseTree, ...]]
+        self._trees_by_start = None  # type: Optional[Dict[int, Tuple[int, List[tuple]]]]
+        self._reachable = None  # type: Optional[Dict[Tuple[int, int], int]]
+        self._gaps = None  # type: Optional[Tuple[Tuple[int, int], ...]]
+        self._gap_size = None  # type: Optional[int]
+        self._max_tree_width = None  # type: Optional[int]
         self.update_weighted_score()
 
     def __hash__(self):
@@ -754,8 +1037,13 @@ class Parse:
     def __eq__(self, other):
         if not isinstance(other, Parse):
             return NotImplemented
-        return self is other or (self._tokens == other._tokens and
-                                 self._parse_trees == other._parse_trees)
+        if self is other:
+            return True
+        # Parses that have both been hashed, as they will have been if they've been looked up in a
+        # set or dict, can usually be told apart without comparing their trees.
+        if self._hash is not None and other._hash is not None and self._hash != other._hash:
+            return False
+        return self._tokens == other._tokens and self._parse_trees == other._parse_trees
 
     def __ne__(self, other):
         if not isinstance(other, Parse):
@@ -779,21 +1067,28 @@ class Parse:
     @property
     def coverage(self):
         """Compute the number of unique combinatoric variations of the trees in this forest."""
-        return reduce(lambda a, b: a * b, (tree.coverage for tree in self._parse_trees), 1)
+        return math.prod(tree.coverage for tree in self._parse_trees)
 
     def to_str(self, simplify=True):
         return '\n'.join(tree.to_str(simplify) for tree in self._parse_trees)
 
     def get_rank(self):
-        score, weight = self.get_weighted_score()
-        return self.total_gap_size(), len(self.parse_trees), -score, -weight
+        # The rank only changes along with the score, which resets it.
+        if self._rank is None:
+            score, weight = self._score
+            self._rank = self.total_gap_size(), len(self._parse_trees), -score, -weight
+        return self._rank
 
     def get_weighted_score(self):
         return self._score
 
     def adjust_score(self, target):
+        # The trees' rules are all adjusted first, so the nodes above them can then be rescored in
+        # a single sweep, instead of once per tree for the ancestors they share.
         for tree in self._parse_trees:
-            tree.adjust_score(target)
+            TreeUtils.adjust_score(tree.root, target)
+        TreeUtils.update_weighted_scores_above(
+            itertools.chain.from_iterable(tree.root.iter_leaves() for tree in self._parse_trees))
         self.update_weighted_score()
 
     def update_weighted_score(self):
@@ -804,6 +1099,7 @@ class Parse:
             total_weighted_score += weighted_score
             total_weight += weight
         self._score = ((total_weighted_score / total_weight if total_weight else 0.0), total_weight)
+        self._rank = None
 
     def restrict(self, categories):
         if isinstance(categories, categorization.Category):
@@ -814,145 +1110,324 @@ class Parse:
                 trees.append(restricted)
         return type(self)(self._tokens, trees)
 
+    def _get_trees_by_span(self) -> Tuple[ParseTree, ...]:
+        # The trees of a parse never change, so they only need to be put in order once.
+        if self._trees_by_span is None:
+            self._trees_by_span = tuple(sorted(self._parse_trees, key=_get_span))
+        return self._trees_by_span
+
     def iter_ambiguities(self):
-        covered = set()
-        for tree1 in self._parse_trees:
-            covered.add(tree1)
-            for tree2 in self._parse_trees:
-                if tree2 in covered:
-                    continue
-                if tree1.is_ambiguous_with(tree2):
-                    yield tree1, tree2
+        # Once the trees are ordered by start index, each tree can only conflict with the trees
+        # that follow it and start before it ends.
+        trees = self._get_trees_by_span()
+        tree_count = len(trees)
+        for index, tree1 in enumerate(trees):
+            end = tree1.token_end_index
+            # Indexing the trees directly, rather than slicing or islicing them, avoids stepping
+            # over or copying the ones before this tree on every pass.
+            for index2 in range(index + 1, tree_count):
+                tree2 = trees[index2]
+                if tree2.token_start_index >= end:
+                    break
+                yield tree1, tree2
 
     def is_ambiguous(self):
-        for _ in self.iter_ambiguities():
-            return True
-        return False
+        # Every node in a tree's root node set covers the same span, so this can't change.
+        if self._ambiguous is None:
+            # When the trees are ordered by start index, any conflict at all means a tree conflicts
+            # with the one right after it, so the sweep stops at the first conflict it finds.
+            self._ambiguous = next(self.iter_ambiguities(), None) is not None
+        return self._ambiguous
 
     def disambiguate(self):
         if len(self._parse_trees) <= 1:
             return self
-        scores = {}
-        for tree in self._parse_trees:
-            scores[tree] = tree.get_weighted_score()
+        # The trees are pulled off a heap, best first, rather than sorted up front, because once the
+        # kept trees cover every token, any remaining tree would conflict with them, and we can
+        # stop without ordering the rest. The position of each tree breaks ties in score, so they
+        # are considered in the same order a stable sort would put them in.
+        heap = []
+        for position, tree in enumerate(self._parse_trees):
+            score, weight = tree.get_weighted_score()
+            heap.append((-score, -weight, position, tree))
+        heapq.heapify(heap)
+        pop = heapq.heappop
+        uncovered = self._token_count
         trees = []
-        for tree in sorted(scores, key=scores.get, reverse=True):
-            for other_tree in trees:
-                if tree.is_ambiguous_with(other_tree):
-                    break
-            else:
-                trees.append(tree)
-        return type(self)(self._tokens, trees)
+        # The kept trees never overlap, so they can be kept ordered by start index, and a new tree
+        # only has to be checked against its immediate neighbors in that order.
+        starts = []
+        ends = []
+        while heap and uncovered > 0:
+            tree = pop(heap)[3]
+            start = tree.token_start_index
+            end = tree.token_end_index
+            index = bisect.bisect_right(starts, start)
+            if (index and ends[index - 1] > start) or (index < len(starts) and starts[index] < end):
+                continue
+            starts.insert(index, start)
+            ends.insert(index, end)
+            trees.append(tree)
+            uncovered -= end - start
+        result = type(self)(self._tokens, trees)
+        # We only kept trees that don't conflict with each other.
+        result._ambiguous = False
+        return result
 
-    def _iter_disambiguation_tails(self, index, max_index, gaps, pieces,
-                                   timeout):
-        if timeout is not None and time.time() >= timeout:
-            raise TimeoutError()
-        if index >= len(self._tokens):
-            if not gaps and not pieces:
-                yield []
-        elif index < max_index and pieces > 0:
-            nearest_end = None
-            for tree in self._parse_trees:
-                if tree.token_start_index == index:
-                    if nearest_end is None or tree.token_end_index < nearest_end:
-                        nearest_end = tree.token_end_index
-                    for tail in self._iter_disambiguation_tails(tree.token_end_index, max_index,
-                                                                gaps, pieces - 1, timeout):
-                        yield [tree] + tail
-            if nearest_end is None:
-                if gaps > 0:
-                    for tail in self._iter_disambiguation_tails(index + 1, max_index, gaps - 1,
-                                                                pieces, timeout):
-                        yield tail
-            else:
+    def _prepare_disambiguation_search(self, deadline: Optional[float]) -> None:
+        # A search that is already running on this parse has done this. If the deadline passes
+        # partway through, nothing is kept, and the next search starts over.
+        if self._trees_by_start is not None:
+            return
+        # The trees are bucketed as (end, tree) pairs, so the search can unpack the end index
+        # instead of looking it up as an attribute. Each bucket is stored together with the
+        # nearest end of its trees, which is where the overlap after its start index ends.
+        buckets = {}  # type: Dict[int, List[Tuple[int, ParseTree]]]
+        for tree in self._parse_trees:
+            buckets.setdefault(tree.token_start_index, []).append((tree.token_end_index, tree))
+        trees_by_start = {start: (min(end for end, _ in trees), trees)
+                          for start, trees in buckets.items()}
+
+        # Before searching, we work out which states of the search lead to at least one tail, so
+        # the search never has to enter a dead end. For each (index, max_index) pair, the
+        # (gaps, pieces) budgets that can be used up exactly are stored as the bits of an integer,
+        # with bit gaps * width + pieces standing for a budget. This lets a whole plane of budgets
+        # be updated at once with a shift or a bitwise or, and the table only has a row for each
+        # pair of an index and a max index, of which there are quadratically many at worst. The
+        # rows are filled in from right to left, following the same moves the search makes.
+        token_count = self._token_count
+        width = token_count + 1
+        no_pieces = sum(1 << (gaps * width) for gaps in range(width))
+        max_pieces = no_pieces << token_count
+        # No move can be made without a piece left to spend.
+        spendable = ((1 << (width * width)) - 1) & ~no_pieces
+        not_max_pieces = ~max_pieces
+        max_indices = {nearest_end for nearest_end, _ in trees_by_start.values()}
+        max_indices.add(token_count)
+        reachable = {(token_count, max_index): 1
+                     for max_index in max_indices}  # type: Dict[Tuple[int, int], int]
+        for index in reversed(range(token_count)):
+            # Filling in the table takes time quadratic in the number of tokens, so it has to
+            # respect the deadline too. A row is enough work to be worth a read of the clock.
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError()
+            bucket = trees_by_start.get(index)
+            overlapping = 0
+            if bucket is not None:
+                nearest_end, trees = bucket
                 for overlap_index in range(index + 1, nearest_end):
-                    for tail in self._iter_disambiguation_tails(overlap_index, nearest_end, gaps,
-                                                                pieces, timeout):
-                        yield tail
+                    overlapping |= reachable.get((overlap_index, nearest_end), 0)
+            for max_index in max_indices:
+                if index >= max_index:
+                    continue
+                if bucket is None:
+                    # Skip a gap.
+                    budgets = reachable.get((index + 1, max_index), 0) << width
+                else:
+                    # Take a tree, or skip into the overlap.
+                    budgets = overlapping
+                    for end, _ in trees:
+                        budgets |= (reachable.get((end, max_index), 0) & not_max_pieces) << 1
+                budgets &= spendable
+                if budgets:
+                    reachable[index, max_index] = budgets
+
+        self._reachable = reachable
+        self._trees_by_start = trees_by_start
+
+    def _is_reachable(self, index: int, max_index: int, gaps: int, pieces: int) -> bool:
+        """Return whether a state of the disambiguation search leads to at least one tail."""
+        assert self._reachable is not None
+        token_count = self._token_count
+        if gaps > token_count or pieces > token_count:
+            return False
+        return bool(self._reachable.get((index, max_index), 0) >>
+                    (gaps * (token_count + 1) + pieces) & 1)
+
+    def _iter_disambiguation_tails(self, index: int, max_index: int, gaps: int, pieces: int,
+                                   deadline: Optional[float]) -> Iterator[List[ParseTree]]:
+        # This is a depth-first search, but it's run from an explicit stack instead of by recursion,
+        # which would pass every tail back up through a generator for each tree in it. The trees
+        # chosen along the way are kept as a linked list of (tree, previous) pairs, so the paths
+        # to sibling states share their common prefix, and a tail is only copied out into a list
+        # when it is complete. Only states known to lead to a tail are ever pushed, so every
+        # step of the search makes progress towards one. The caller is responsible for checking
+        # the starting state.
+        token_count = self._token_count
+        if index >= token_count:
+            yield []
+            return
+        width = token_count + 1
+        trees_by_start = self._trees_by_start
+        reachable = self._reachable
+        assert trees_by_start is not None and reachable is not None
+        popped = 0
+        stack = [(index, max_index, gaps, pieces, None)]  # type: List[tuple]
+        while stack:
+            index, max_index, gaps, pieces, path = stack.pop()
+            # Reading the clock on every step is expensive relative to the rest of the work done
+            # here, so we only sample it once every 256 steps.
+            popped += 1
+            if deadline is not None and not popped & 0xFF and time.monotonic() >= deadline:
+                raise TimeoutError()
+            bucket = trees_by_start.get(index)
+            if bucket is None:
+                stack.append((index + 1, max_index, gaps - 1, pieces, path))
+                continue
+            # Successors are pushed in reverse so they are searched in their natural order.
+            nearest_end, trees = bucket
+            budget = gaps * width + pieces
+            for overlap_index in range(nearest_end - 1, index, -1):
+                if reachable.get((overlap_index, nearest_end), 0) >> budget & 1:
+                    stack.append((overlap_index, nearest_end, gaps, pieces, path))
+            budget -= 1
+            for end, tree in reversed(trees):
+                if not reachable.get((end, max_index), 0) >> budget & 1:
+                    continue
+                if end < token_count:
+                    stack.append((end, max_index, gaps, pieces - 1, (tree, path)))
+                    continue
+                # Only a tree that runs to the end of the tokens can finish a tail, and the
+                # state it leads to has nowhere else to go, so we emit the tail right here
+                # instead of pushing that state just to pop it back off.
+                tail = [tree]  # type: List[ParseTree]
+                previous = path
+                while previous is not None:
+                    tree, previous = previous
+                    tail.append(tree)
+                tail.reverse()
+                yield tail
 
     # TODO: This fails if we have a partial parse in the *middle* of the
     #       string, surrounded by gaps.
     def iter_disambiguations(self, gaps=None, pieces=None, timeout=None):
+        token_count = self._token_count
+        min_gaps = self.total_gap_size()
+        min_pieces = self.min_disambiguation_size()
         if gaps is None:
-            gaps_seq = range(self.total_gap_size(), len(self._tokens) + 1)
+            gaps_seq = range(min_gaps, token_count + 1)
         else:
-            gaps_seq = [gaps] if gaps >= self.total_gap_size() else []
+            gaps_seq = [gaps] if gaps >= min_gaps else []
         if pieces is None:
-            pieces_seq = range(self.min_disambiguation_size(), len(self._tokens) + 1)
+            pieces_seq = range(min_pieces, token_count + 1)
         else:
-            pieces_seq = [pieces] if pieces >= self.min_disambiguation_size() else []
+            pieces_seq = [pieces] if pieces >= min_pieces else []
+        if timeout is None:
+            deadline = None
+        else:
+            # The timeout is a wall clock time, but the wall clock can jump around when the system
+            # time is adjusted, so we translate it to a deadline on the monotonic clock.
+            deadline = time.monotonic() + (timeout - time.time())
         try:
-            success = False
-            for gaps in gaps_seq:
-                for pieces in pieces_seq:
-                    for tail in self._iter_disambiguation_tails(0, len(self._tokens), gaps, pieces,
-                                                                timeout):
-                        yield type(self)(self._tokens, tail)
-                        success = True
-                    if success:
-                        break
-                if success:
-                    break
+            self._prepare_disambiguation_search(deadline)
         except TimeoutError:
-            # Don't do anything; we just want to exit early if this
-            # happens.
-            pass
+            return
+        try:
+            # Only the first (gaps, pieces) combination that produces any results is searched.
+            # Since we know ahead of time which ones do, there is no need to try the others.
+            for gaps, pieces in itertools.product(gaps_seq, pieces_seq):
+                if self._is_reachable(0, token_count, gaps, pieces):
+                    break
+            else:
+                return
+            # The same disambiguation can be reached by more than one path through the search, so
+            # we filter out repeats here rather than leaving it to the caller. Tails always list
+            # their trees from left to right, and the trees are unique within this parse, so the
+            # tree ids suffice to identify a tail without hashing the trees themselves.
+            seen = set()
+            tails = self._iter_disambiguation_tails(0, token_count, gaps, pieces, deadline)
+            try:
+                for tail in tails:
+                    key = tuple(map(id, tail))
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    yield type(self)(self._tokens, tail)
+            except TimeoutError:
+                # Don't do anything; we just want to exit early if this
+                # happens.
+                pass
+            finally:
+                # If our caller stops early, release the search stack right away instead of
+                # waiting on the garbage collector.
+                tails.close()
+        finally:
+            # The reachability table takes space quadratic in the number of tokens, times the
+            # number of budgets, and parses are often kept around long after they have been
+            # disambiguated, so the table is only held onto while a search is running. A search
+            # that is still running elsewhere keeps its own references to it.
+            self._reachable = None
+            self._trees_by_start = None
 
     def get_disambiguations(self, gaps=None, pieces=None, timeout=None):
         return set(self.iter_disambiguations(gaps, pieces, timeout))
 
+    def iter_ranked_disambiguations(self, gaps=None, pieces=None, timeout=None):
+        for disambiguation in self.iter_disambiguations(gaps, pieces, timeout):
+            yield disambiguation, disambiguation.get_rank()
+
     def get_ranked_disambiguations(self, gaps=None, pieces=None, timeout=None):
-        ranks = {}
-        for disambiguation in self.get_disambiguations(gaps, pieces, timeout):
-            ranks[disambiguation] = disambiguation.get_rank()
-        return ranks
+        return dict(self.iter_ranked_disambiguations(gaps, pieces, timeout))
 
-    def get_sorted_disambiguations(self, gaps=None, pieces=None, timeout=None):
+    def get_sorted_disambiguations(self, gaps=None, pieces=None, timeout=None, top_k=None):
+        if top_k is not None:
+            # Only the best few are wanted, so we don't need to hold onto or sort the rest.
+            return heapq.nsmallest(top_k, self.iter_ranked_disambiguations(gaps, pieces, timeout),
+                                   key=_get_second)
         ranks = self.get_ranked_disambiguations(gaps, pieces, timeout)
         return [(disambiguation, ranks[disambiguation])
                 for disambiguation in sorted(ranks, key=ranks.get)]
 
+    def _get_gaps(self) -> Tuple[Tuple[int, int], ...]:
+        # The trees of a parse never change, so the gaps and their total size are only computed
+        # once, together.
+        if self._gaps is None:
+            # The spans are already in order, so the sort in the sweep has next to nothing to do.
+            self._gaps = tuple(self._iter_span_gaps(self._token_count,
+                                                    [(tree.token_start_index, tree.token_end_index)
+                                                     for tree in self._get_trees_by_span()]))
+            self._gap_size = sum(end - start for start, end in self._gaps)
+        return self._gaps
+
     def iter_gaps(self):
-        gap_start = None
-        index = -1
-        for index in range(len(self._tokens)):
-            for tree in self._parse_trees:
-                if tree.token_start_index <= index < tree.token_end_index:
-                    if gap_start is not None:
-                        yield gap_start, index
-                        gap_start = None
-                    break
-            else:
-                if gap_start is None:
-                    gap_start = index
-        if gap_start is not None:
-            yield gap_start, index + 1
+        return iter(self._get_gaps())
+
+    @staticmethod
+    def _iter_span_gaps(token_count, spans):
+        # Sweeping the spans in start order finds the uncovered stretches without visiting the
+        # tokens one at a time.
+        covered_end = 0
+        for start, end in sorted(spans):
+            if start > covered_end:
+                yield covered_end, start
+            if end > covered_end:
+                covered_end = end
+        if covered_end < token_count:
+            yield covered_end, token_count
 
     def has_gaps(self):
-        for _ in self.iter_gaps():
-            return True
-        return False
+        return self.total_gap_size() > 0
 
     def total_gap_size(self):
-        size = 0
-        for start, end in self.iter_gaps():
-            size += end - start
-        return size
+        if self._gap_size is None:
+            self._get_gaps()
+        return self._gap_size
 
     def max_tree_width(self):
-        max_width = 0
-        for tree in self._parse_trees:
-            width = tree.token_end_index - tree.token_start_index
-            if max_width is None or width > max_width:
-                max_width = width
-        return max_width
+        if self._max_tree_width is None:
+            max_width = 0
+            for tree in self._parse_trees:
+                width = tree.token_end_index - tree.token_start_index
+                if width > max_width:
+                    max_width = width
+            self._max_tree_width = max_width
+        return self._max_tree_width
 
     def min_disambiguation_size(self):
         max_width = self.max_tree_width()
         if not max_width:
             return 0
-        return int(math.floor(len(self._tokens) / float(max_width)))
+        return self._token_count // max_width
 
     def get_parse_graphs(self):
         assert not self.is_ambiguous()
@@ -1,23 +1,46 @@
 # -*- coding: utf-8 -*-
-from typing import TYPE_CHECKING
+import weakref
+from typing import TYPE_CHECKING, Dict, MutableMapping
 
 from pyramids import categorization
 
 if TYPE_CHECKING:
+    from pyramids.categorization import Category
     from pyramids.model import Model
 
 
+# The extended version of each category, for each model. A model's property inheritance rules never
+# change once it's built, and the leaf rules extend the same few categories over and over, so each
+# category only needs to be extended once per model.
+_extended_categories: MutableMapping['Model', Dict['Category', 'Category']] = \
+    weakref.WeakKeyDictionary()
+
+
 # TODO: Consider moving this to _categorization.pyx
 def extend_properties(model: 'Model',
                       category: 'categorization.Category') -> 'categorization.Category':
     """Extend the category's properties per the inheritance rules."""
+    extended_categories = _extended_categories.get(model)
+    if extended_categories is None:
+        extended_categories = _extended_categories[model] = {}
+    extended = extended_categories.get(category)
+    if extended is None:
+        extended = extended_categories[category] = _extend_properties(model, category)
+    return extended
+
+
+def _extend_properties(model: 'Model',
+                       category: 'categorization.Category') -> 'categorization.Category':
+    """Extend the category's properties per the inheritance rules, without consulting the cache."""
+    name = category.name
+    rules = model.property_inheritance_rules
     positive = set(category.positive_properties)
     negative = set(category.negative_properties)
     more = True
     while more:
         more = False
-        for rule in model.property_inheritance_rules:
-            new = rule(category.name, positive, negative)
+        for rule in rules:
+            new = rule(name, positive, negative)
             if new:
                 new_positive, new_negative = new
                 new_positive -= positive
@@ -27,4 +50,4 @@ def extend_properties(model: 'Model',
                     positive |= new_positive
                     negative |= new_negative
     negative -= positive
-    return categorization.Category(category.name, positive, negative)
+    return categorization.Category(name, positive, negative)
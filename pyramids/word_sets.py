@@ -16,7 +16,9 @@ class WordSetUtils:
     @staticmethod
     def save_word_set(file_path: str, words: Iterable[str]) -> None:
         """Load a word set and return it as a set rule."""
+        # A sorted set in natural order is already deduplicated and sorted, so there's no need to
+        # build another one.
+        if not isinstance(words, SortedSet) or words.key is not None:
+            words = SortedSet(words)
         with open(file_path, 'w', encoding='utf-8') as file:
-            for word in SortedSet(words):
-                file.write(word)
-                file.write('\n')
+            file.write(''.join(word + '\n' for word in words))
@@ -0,0 +1,55 @@
+"""Test suite for the parser's work queue (pyramids/parsing.py)."""
+
+import pytest
+
+from pyramids.parsing import PrioritySet
+
+
+def test_priority_set_order():
+    """Ensure that values are popped smallest key first, and in insertion order among equal
+    keys."""
+    queue = PrioritySet(len)
+    for value in ['ccc', 'a', 'bb', 'x', 'dd', 'eee', 'y']:
+        queue.add(value)
+    popped = [queue.pop() for _ in range(len(queue))]
+    assert popped == ['a', 'x', 'y', 'bb', 'dd', 'ccc', 'eee']
+    assert not queue
+
+
+def test_priority_set_dedup():
+    """Ensure that a value is only queued once while it is waiting, and can be queued again once
+    it has been popped."""
+    queue = PrioritySet(len)
+    queue.add('a')
+    queue.add('bb')
+    queue.add('a')
+    assert len(queue) == 2
+    assert 'a' in queue
+    assert queue.pop() == 'a'
+    assert 'a' not in queue
+    queue.add('a')
+    assert len(queue) == 2
+    assert [queue.pop(), queue.pop()] == ['a', 'bb']
+
+
+def test_priority_set_pop_empty():
+    """Ensure that popping from an empty priority set raises IndexError, like popping from an
+    empty list."""
+    queue = PrioritySet(len)
+    with pytest.raises(IndexError):
+        queue.pop()
+    queue.add('a')
+    queue.pop()
+    with pytest.raises(IndexError):
+        queue.pop()
+
+
+def test_priority_set_iteration_order():
+    """Ensure that iterating over a priority set yields the waiting values in the order they would
+    be popped, without removing them."""
+    queue = PrioritySet(len)
+    for value in ['ccc', 'a', 'bb', 'x', 'dd']:
+        queue.add(value)
+    assert list(queue) == ['a', 'x', 'bb', 'dd', 'ccc']
+    assert len(queue) == 5
+    assert list(queue) == [queue.pop() for _ in range(len(queue))]
@@ -0,0 +1,170 @@
+"""Test suite for parse trees (pyramids/trees.py)."""
+
+import itertools
+import random
+
+from pyramids import scoring, trees
+from pyramids.categorization import Category
+from pyramids.category_maps import CategoryMap
+from pyramids.rules.parse_rule import ParseRule
+from pyramids.tokenization import TokenSequence
+
+
+class _SpanRule(ParseRule):
+    """A parse rule with a fixed default score, which scores nodes by category and span."""
+
+    def __init__(self, name, score):
+        super().__init__(score, 0.5)
+        self._name = name
+
+    def __str__(self):
+        return self._name
+
+    def iter_scoring_features(self, parse_node):
+        payload = parse_node.payload
+        yield scoring.ScoringFeature(('category', str(payload.category.name)))
+        yield scoring.ScoringFeature(('span', str(payload.token_start_index),
+                                      str(payload.token_end_index)))
+
+
+def _build_random_forest(seed):
+    """Build a small random parse forest in a category map, the same way for the same seed. Return
+    the tokens, and every node and node set in the order they were created."""
+    rnd = random.Random(seed)
+    token_count = rnd.randint(1, 8)
+    tokens = TokenSequence([('w%d' % index, index * 3, index * 3 + 2)
+                            for index in range(token_count)])
+    categories = [Category(name) for name in ('A', 'B', 'C')]
+    rules = [_SpanRule('r%d' % index, rnd.random()) for index in range(4)]
+    category_map = CategoryMap()
+    nodes = []
+    node_sets = []
+    for index in range(token_count):
+        for category in rnd.sample(categories, rnd.randint(1, 2)):
+            node = trees.ParseTreeUtils.make_leaf_parse_tree_node(tokens, rnd.choice(rules),
+                                                                  index, category)
+            category_map.add(node)
+            nodes.append(node)
+            node_sets.append(category_map.get_node_set(node))
+    for _ in range(rnd.randint(0, 30)):
+        components = [rnd.choice(node_sets)]
+        for _ in range(rnd.randint(1, 2)):
+            end = components[-1].payload.token_end_index
+            following = [node_set for node_set in node_sets
+                         if node_set.payload.token_start_index == end]
+            if not following:
+                break
+            components.append(rnd.choice(following))
+        if len(components) < 2:
+            continue
+        node = trees.ParseTreeUtils.make_branch_parse_tree_node(
+            tokens, rnd.choice(rules), rnd.randrange(len(components)), rnd.choice(categories),
+            components)
+        if category_map.add(node):
+            node_sets.append(category_map.get_node_set(node))
+        nodes.append(node)
+    return tokens, nodes, node_sets
+
+
+def _update_weighted_score_recursively(node, affected_child=None, recurse=True):
+    """Propagate a score change by recursing into every parent, the way scores were updated before
+    the changed ancestors were gathered level by level."""
+    if node.recompute_weighted_score(affected_child) and recurse:
+        for parent in node.iter_parents():
+            _update_weighted_score_recursively(parent, node)
+
+
+def test_score_propagation_matches_recursion():
+    """Ensure that propagating score changes one level of changed ancestors at a time leaves every
+    node and node set with the same score as propagating them recursively."""
+    update_weighted_score = trees.TreeUtils.__dict__['update_weighted_score']
+    for seed in range(200):
+        _, nodes, node_sets = _build_random_forest(seed)
+        actual = [node.score for node in nodes + node_sets]
+        trees.TreeUtils.update_weighted_score = staticmethod(_update_weighted_score_recursively)
+        try:
+            _, nodes, node_sets = _build_random_forest(seed)
+            expected = [node.score for node in nodes + node_sets]
+        finally:
+            trees.TreeUtils.update_weighted_score = update_weighted_score
+        assert actual == expected, seed
+
+
+def _iter_tails_exhaustively(parse_trees, token_count, index, max_index, gaps, pieces):
+    """Enumerate the disambiguation tails from a state of the search by trying every move, without
+    knowing in advance which ones lead anywhere."""
+    if index >= token_count:
+        if not gaps and not pieces:
+            yield []
+        return
+    if index >= max_index or pieces <= 0:
+        return
+    starting = [tree for tree in parse_trees if tree.token_start_index == index]
+    if not starting:
+        if gaps > 0:
+            yield from _iter_tails_exhaustively(parse_trees, token_count, index + 1, max_index,
+                                                gaps - 1, pieces)
+        return
+    for tree in starting:
+        for tail in _iter_tails_exhaustively(parse_trees, token_count, tree.token_end_index,
+                                             max_index, gaps, pieces - 1):
+            yield [tree] + tail
+    nearest_end = min(tree.token_end_index for tree in starting)
+    for overlap_index in range(index + 1, nearest_end):
+        yield from _iter_tails_exhaustively(parse_trees, token_count, overlap_index, nearest_end,
+                                            gaps, pieces)
+
+
+def test_disambiguations_match_exhaustive_search():
+    """Ensure that the disambiguation search, which only enters states it has worked out ahead of
+    time to be reachable, finds exactly the disambiguations an exhaustive search does."""
+    for seed in range(200):
+        tokens, _, node_sets = _build_random_forest(seed)
+        rnd = random.Random(seed)
+        parse_trees = [trees.ParseTree(tokens, node_set) for node_set in node_sets
+                       if rnd.random() < 0.7]
+        parse = trees.Parse(tokens, parse_trees)
+        token_count = len(tokens)
+        budgets = list(itertools.product(range(parse.total_gap_size(), token_count + 1),
+                                         range(parse.min_disambiguation_size(), token_count + 1)))
+        first_found = set()
+        for gaps, pieces in budgets:
+            expected = {frozenset(tail) for tail in
+                        _iter_tails_exhaustively(parse_trees, token_count, 0, token_count, gaps,
+                                                 pieces)}
+            actual = {disambiguation.parse_trees
+                      for disambiguation in parse.iter_disambiguations(gaps, pieces)}
+            assert actual == expected, (seed, gaps, pieces)
+            if expected and not first_found:
+                first_found = expected
+        # Without a budget, only the first one that leads anywhere is searched.
+        actual = {disambiguation.parse_trees for disambiguation in parse.iter_disambiguations()}
+        assert actual == first_found, seed
+
+
+def test_node_added_late_sees_component_score_changes():
+    """Ensure that a node built before one of its components' scores changed, but only added to a
+    node set afterwards, is scored with the components' current scores."""
+    tokens = TokenSequence([('w0', 0, 2), ('w1', 3, 5)])
+    category = Category('A')
+    category_map = CategoryMap()
+    weak_rule = _SpanRule('weak', 0.1)
+    for index in range(2):
+        category_map.add(trees.ParseTreeUtils.make_leaf_parse_tree_node(tokens, weak_rule, index,
+                                                                         category))
+    node_sets = [category_map.get_node_set(node) for node in
+                 (trees.ParseTreeUtils.make_leaf_parse_tree_node(tokens, weak_rule, index,
+                                                                 category)
+                  for index in range(2))]
+    branch = trees.ParseTreeUtils.make_branch_parse_tree_node(tokens, _SpanRule('branch', 0.5), 0,
+                                                              category, node_sets)
+    stale_score = branch.score
+    strong_rule = _SpanRule('strong', 0.9)
+    category_map.add(trees.ParseTreeUtils.make_leaf_parse_tree_node(tokens, strong_rule, 0,
+                                                                     category))
+    category_map.add(branch)
+    fresh = trees.ParseTreeUtils.make_branch_parse_tree_node(tokens, _SpanRule('branch', 0.5), 0,
+                                                             category, node_sets)
+    assert branch.score == fresh.score
+    assert branch.score != stale_score
+    assert category_map.get_node_set(branch).score == fresh.score